@@ -0,0 +1,344 @@
+"""
+RISK ALERTS
+This file watches submitted questionnaires for answers that need a human
+to look at them quickly (for example, any positive answer to PHQ-9 question 9
+about self-harm) and sends an alert to the research team.
+
+Alerts are sent by background worker threads, so the participant never has to
+wait for an email or webhook to go out before seeing the "complete" page.
+The app also saves each alert in the database (RiskAlert) together with the
+answers, and remembers which sinks each alert reached (AlertDelivery), so
+alerts that were not delivered when the app stopped are sent again - only
+to the sinks that missed them - the next time it starts.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import smtplib
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+
+# ALERT RULES
+# Each rule looks at one submitted questionnaire and decides whether it
+# should raise an alert. A submission is a dictionary like:
+#   {'user_id': 3, 'username': 'participant_003', 'questionnaire_type': 'PHQ9',
+#    'ratings': {1: 0, 2: 1, ..., 9: 2}, 'submitted_at': '2025-...'}
+
+class ItemRule:
+    """
+    Raise an alert when a single question is rated at or above a threshold.
+    Used for PHQ-9 question 9 ("thoughts that you would be better off dead").
+    """
+
+    def __init__(self, name, questionnaire_type, question_number, min_rating):
+        self.name = name
+        self.questionnaire_type = questionnaire_type
+        self.question_number = question_number
+        self.min_rating = min_rating
+
+    def check(self, submission):
+        """Return an alert reason (string) if the rule matches, otherwise None."""
+        if submission['questionnaire_type'] != self.questionnaire_type:
+            return None
+        rating = submission['ratings'].get(self.question_number)
+        if rating is not None and rating >= self.min_rating:
+            return (f'{self.questionnaire_type} question {self.question_number} '
+                    f'rated {rating} (threshold {self.min_rating})')
+        return None
+
+
+class TotalRule:
+    """
+    Raise an alert when the total score of a questionnaire crosses a threshold.
+    direction '>=' is for scales where high is bad (PHQ-9 total >= 20 means
+    "severe depression"); '<=' is for scales where low is bad (SWLS total
+    <= 9 means "extremely dissatisfied").
+    """
+
+    DIRECTIONS = ('>=', '<=')
+
+    def __init__(self, name, questionnaire_type, threshold, direction='>='):
+        if direction not in self.DIRECTIONS:
+            raise ValueError(f'Unknown direction {direction!r} for {name}, use one of {self.DIRECTIONS}')
+        self.name = name
+        self.questionnaire_type = questionnaire_type
+        self.threshold = threshold
+        self.direction = direction
+
+    def check(self, submission):
+        """Return an alert reason (string) if the rule matches, otherwise None."""
+        if submission['questionnaire_type'] != self.questionnaire_type:
+            return None
+        total = sum(submission['ratings'].values())
+        if self.direction == '>=':
+            matched = total >= self.threshold
+        else:
+            matched = total <= self.threshold
+        if matched:
+            return (f'{self.questionnaire_type} total score {total} '
+                    f'(threshold {self.direction} {self.threshold})')
+        return None
+
+
+def build_rules(config):
+    """
+    Create the list of alert rules from the app configuration.
+    The PHQ-9 question 9 rule is always included; total-score rules come
+    from the ALERT_TOTAL_THRESHOLDS setting, where each value is either a
+    number (meaning ">= number") or a (direction, number) pair.
+    """
+    rules = [
+        ItemRule('phq9_item9', 'PHQ9', 9, config.get('ALERT_PHQ9_ITEM9_MIN_RATING', 1))
+    ]
+    for q_type, threshold in config.get('ALERT_TOTAL_THRESHOLDS', {}).items():
+        direction = '>='
+        if isinstance(threshold, (tuple, list)):
+            direction, threshold = threshold
+        rules.append(TotalRule(f'{q_type.lower()}_total', q_type, threshold, direction))
+    return rules
+
+
+# ALERT SINKS
+# A sink is somewhere an alert gets delivered to. Every sink has a send()
+# method that raises an exception if delivery failed (so it can be retried),
+# and a name used to remember which sinks already received an alert.
+
+class LogFileSink:
+    """Append each alert as one line of JSON to a log file."""
+
+    name = 'log_file'
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, alert):
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(alert) + '\n')
+
+
+class SMTPSink:
+    """
+    Send each alert as an email. By default this talks to a local SMTP
+    server (e.g. `python -m aiosmtpd -n -l localhost:1025`) for testing.
+    """
+
+    name = 'smtp'
+
+    def __init__(self, host, port, sender, recipients):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+
+    def send(self, alert):
+        message = EmailMessage()
+        message['Subject'] = f"[Questionnaire Study] Risk alert for {alert['username']}"
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content('\n'.join([
+            f"Participant: {alert['username']} (user id {alert['user_id']})",
+            f"Questionnaire: {alert['questionnaire_type']}",
+            f"Submitted at: {alert['submitted_at']}",
+            '',
+            'Reasons:',
+        ] + [f'  - {reason}' for reason in alert['reasons']]))
+        with smtplib.SMTP(self.host, self.port, timeout=10) as server:
+            server.send_message(message)
+
+
+class WebhookSink:
+    """POST each alert as JSON to a URL (e.g. a local mock server)."""
+
+    name = 'webhook'
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alert):
+        body = json.dumps(alert).encode('utf-8')
+        req = urllib.request.Request(self.url, data=body, method='POST',
+                                     headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            if resp.status >= 400:
+                raise RuntimeError(f'Webhook returned HTTP {resp.status}')
+
+
+def build_sinks(config):
+    """
+    Create the list of alert sinks from the app configuration.
+    A sink is only enabled when its setting is filled in.
+    """
+    sinks = []
+    if config.get('ALERT_LOG_FILE'):
+        sinks.append(LogFileSink(config['ALERT_LOG_FILE']))
+    if config.get('ALERT_SMTP_RECIPIENTS'):
+        sinks.append(SMTPSink(config.get('ALERT_SMTP_HOST', 'localhost'),
+                              config.get('ALERT_SMTP_PORT', 1025),
+                              config.get('ALERT_SMTP_SENDER', 'alerts@localhost'),
+                              config['ALERT_SMTP_RECIPIENTS']))
+    if config.get('ALERT_WEBHOOK_URL'):
+        sinks.append(WebhookSink(config['ALERT_WEBHOOK_URL']))
+    return sinks
+
+
+# ALERT DISPATCHER
+# The request thread checks the rules (cheap) and puts matching alerts on a
+# bounded queue; a few worker threads deliver them to the sinks.
+
+class AlertDispatcher:
+    """
+    Background alert pipeline.
+    submit() never blocks: if the queue is full the alert is logged and left
+    for the next restart (the app keeps it pending in the database) rather
+    than slowing down the participant's request.
+    on_sink_delivered(alert, sink_name) is called each time a sink accepts
+    an alert, and on_delivered(alert) once it reached every sink. Sinks
+    listed in alert['delivered_sinks'] are skipped, so a re-sent alert only
+    goes to the sinks that missed it.
+    """
+
+    def __init__(self, rules, sinks, workers=2, queue_size=1000,
+                 max_retries=3, retry_delay=1.0, on_delivered=None,
+                 on_sink_delivered=None):
+        self.rules = rules
+        self.sinks = sinks
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_delivered = on_delivered
+        self.on_sink_delivered = on_sink_delivered
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'alert-worker-{i}',
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def evaluate(self, submission):
+        """Run every rule; return an alert dictionary if any rule matched."""
+        reasons = []
+        for rule in self.rules:
+            reason = rule.check(submission)
+            if reason:
+                reasons.append(reason)
+        if not reasons:
+            return None
+        return {
+            'user_id': submission['user_id'],
+            'username': submission.get('username'),
+            'questionnaire_type': submission['questionnaire_type'],
+            'submitted_at': submission['submitted_at'],
+            'reasons': reasons,
+            'created_at': datetime.utcnow().isoformat(),
+        }
+
+    def submit(self, alert):
+        """
+        Queue an alert (from evaluate()) for delivery.
+        Returns True if it was queued, False if there are no sinks or the
+        queue was full.
+        """
+        if not self.sinks:
+            return False
+        try:
+            self._queue.put_nowait(alert)
+            return True
+        except queue.Full:
+            logger.error('Alert queue full, alert for user %s not sent now: %s',
+                         alert.get('user_id'), json.dumps(alert))
+            return False
+
+    def join(self):
+        """Wait until every queued alert has been processed (useful in scripts)."""
+        self._queue.join()
+
+    def shutdown(self, timeout=10):
+        """
+        Give the workers up to `timeout` seconds to send what is queued.
+        Called automatically when the app exits; anything still undelivered
+        is written to the log (and stays pending in the database).
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+            unfinished = self._queue.unfinished_tasks
+        if not unfinished:
+            return
+        while True:
+            try:
+                alert = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            logger.error('Undelivered alert at shutdown: %s', json.dumps(alert))
+        logger.error('%d alert(s) not delivered before shutdown; they will be '
+                     'sent again when the app next starts', unfinished)
+
+    def _worker(self):
+        while True:
+            alert = self._queue.get()
+            try:
+                already = set(alert.get('delivered_sinks', []))
+                message = {k: v for k, v in alert.items() if k != 'delivered_sinks'}
+                # Try every sink that hasn't got it yet, even if an earlier one failed
+                all_delivered = True
+                for sink in self.sinks:
+                    if sink.name in already:
+                        continue
+                    if self._deliver(sink, message):
+                        if self.on_sink_delivered:
+                            self.on_sink_delivered(alert, sink.name)
+                    else:
+                        all_delivered = False
+                if all_delivered and self.on_delivered:
+                    self.on_delivered(alert)
+            except Exception:
+                logger.exception('Unexpected error while processing alert')
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, sink, alert):
+        """Send one alert to one sink, retrying with a growing delay on failure."""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                sink.send(alert)
+                return True
+            except Exception as e:
+                logger.warning('Alert delivery via %s failed (attempt %d/%d): %s',
+                               type(sink).__name__, attempt, self.max_retries, e)
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_delay * attempt)
+        logger.error('Giving up on alert for user %s via %s',
+                     alert['user_id'], type(sink).__name__)
+        return False
+
+
+def create_dispatcher(config, on_delivered=None, on_sink_delivered=None):
+    """
+    Build an AlertDispatcher from the Flask app configuration and make sure
+    it gets a chance to finish sending when the app exits.
+    """
+    dispatcher = AlertDispatcher(build_rules(config),
+                                 build_sinks(config),
+                                 workers=config.get('ALERT_WORKERS', 2),
+                                 queue_size=config.get('ALERT_QUEUE_SIZE', 1000),
+                                 max_retries=config.get('ALERT_MAX_RETRIES', 3),
+                                 retry_delay=config.get('ALERT_RETRY_DELAY', 1.0),
+                                 on_delivered=on_delivered,
+                                 on_sink_delivered=on_sink_delivered)
+    atexit.register(dispatcher.shutdown, config.get('ALERT_SHUTDOWN_TIMEOUT', 10))
+    return dispatcher
@@ -4,10 +4,23 @@ This is the heart of our web application. It creates the Flask app,
 sets up routes (URLs), and handles all user interactions.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from models import db, User, Response, QuestionnaireCompletion
+from flask import (Flask, render_template, request, redirect, url_for, session, flash,
+                   jsonify, send_from_directory, g)
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from models import (db, User, Response, QuestionnaireCompletion, SubmissionReceipt, ApiToken,
+                    RiskAlert, AlertDelivery)
 from config import Config
+from alerts import create_dispatcher
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+import json
 import os
+import threading
+import uuid
 
 # Create the Flask application instance
 app = Flask(__name__)
@@ -22,6 +35,12 @@ db.init_app(app)
 # This is where our SQLite database file will be stored
 os.makedirs(os.path.join(app.root_path, 'instance'), exist_ok=True)
 
+# Start the background risk-alert pipeline (see alerts.py)
+alert_dispatcher = create_dispatcher(
+    app.config,
+    on_delivered=lambda alert: mark_alert_delivered(alert),
+    on_sink_delivered=lambda alert, sink: mark_sink_delivered(alert, sink))
+
 
 # QUESTIONNAIRE DATA
 # These dictionaries contain all the questions for each questionnaire
@@ -74,6 +93,12 @@ PHQ9_SCALE = {
     3: "Nearly every day"
 }
 
+# All questionnaires by type, as stored in the database
+QUESTIONNAIRES = {
+    'SWLS': {'questions': SWLS_QUESTIONS, 'scale': SWLS_SCALE},
+    'PHQ9': {'questions': PHQ9_QUESTIONS, 'scale': PHQ9_SCALE}
+}
+
 
 # HELPER FUNCTIONS
 
@@ -105,6 +130,418 @@ def get_user_completion_status(user_id):
     }
 
 
+def get_api_user():
+    """
+    Find out who is calling the JSON API.
+    Scripts send "Authorization: Bearer <token>"; the web pages (e.g. the
+    offline sync) are recognised by their normal login session.
+    Returns the User, or None if the caller is not logged in.
+    """
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        token = ApiToken.query.filter_by(
+            token_hash=ApiToken.hash_token(auth_header[len('Bearer '):].strip())
+        ).first()
+        lifetime = timedelta(seconds=app.config['API_TOKEN_LIFETIME'])
+        if token and token.created_at + lifetime > datetime.utcnow():
+            g.api_token = token
+            return token.user
+        return None
+    if 'user_id' in session:
+        return db.session.get(User, session['user_id'])
+    return None
+
+
+def api_login_required(f):
+    """
+    DECORATOR FUNCTION
+    Like login_required, but for the JSON API: instead of redirecting to the
+    login page, it answers with a 401 error that scripts can understand.
+    The logged-in user is available as g.api_user.
+    """
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.api_user = get_api_user()
+        if g.api_user is None:
+            return jsonify({'error': 'Authentication required.'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def api_admin_required(f):
+    """
+    DECORATOR FUNCTION
+    Only lets researchers listed in ADMIN_USERNAMES (config.py) through.
+    """
+    from functools import wraps
+    @wraps(f)
+    @api_login_required
+    def decorated_function(*args, **kwargs):
+        if g.api_user.username not in app.config['ADMIN_USERNAMES']:
+            return jsonify({'error': 'Admin access required.'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def validate_answers(questionnaire_type, answers):
+    """
+    Check a list of answers sent to the API, e.g.
+        [{'question_number': 1, 'rating': 4, 'explanation': '...'}, ...]
+    Every question must be answered exactly once with a rating from the
+    scale and a non-empty explanation.
+
+    Returns a list of (question_number, rating, explanation) tuples, sorted
+    by question number. Raises ValueError with a readable message otherwise.
+    """
+    questionnaire = QUESTIONNAIRES[questionnaire_type]
+    if not isinstance(answers, list):
+        raise ValueError('answers must be a list.')
+
+    by_number = {}
+    for answer in answers:
+        if not isinstance(answer, dict):
+            raise ValueError('Each answer must be an object.')
+        q_num = answer.get('question_number')
+        rating = answer.get('rating')
+        explanation = answer.get('explanation')
+        # Only real integers: lists/objects can't be looked up in the
+        # dictionaries, and 1.0 or true must not count as a rating of 1
+        if type(q_num) is not int or q_num not in questionnaire['questions'] or q_num in by_number:
+            raise ValueError(f'Unexpected or repeated question number: {q_num!r}.')
+        if rating is None or not isinstance(explanation, str) or not explanation.strip():
+            raise ValueError(f'Please complete question {q_num} (both rating and explanation).')
+        if type(rating) is not int or rating not in questionnaire['scale']:
+            raise ValueError(f'Question {q_num} has an invalid rating: {rating!r}.')
+        by_number[q_num] = (q_num, rating, explanation.strip())
+
+    missing = [q for q in questionnaire['questions'] if q not in by_number]
+    if missing:
+        raise ValueError(f'Please complete question {missing[0]} (both rating and explanation).')
+    return [by_number[q] for q in sorted(by_number)]
+
+
+def answers_from_form(questionnaire_type):
+    """
+    Read a submitted questionnaire form (fields q1_rating, q1_explanation, ...)
+    into the list of answers that validate_answers() expects.
+    """
+    answers = []
+    for q_num in QUESTIONNAIRES[questionnaire_type]['questions']:
+        rating = request.form.get(f'q{q_num}_rating', '')
+        answers.append({
+            'question_number': q_num,
+            'rating': int(rating) if rating.isdigit() else None,
+            'explanation': request.form.get(f'q{q_num}_explanation')
+        })
+    return answers
+
+
+def submit_questionnaire_form(questionnaire_type, endpoint, name):
+    """
+    Handle the POST of a questionnaire page (used by swls() and phq9()).
+    A second submit of the same questionnaire (double-click, browser retry)
+    inserts nothing and lands on the same completion page as the first.
+    """
+    user_id = session['user_id']
+
+    # Validate that both rating and explanation are provided for every question
+    try:
+        answers = validate_answers(questionnaire_type, answers_from_form(questionnaire_type))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for(endpoint))
+
+    try:
+        _, created = save_questionnaire(user_id, questionnaire_type, answers)
+        risk_alert = record_risk_alert(user_id, questionnaire_type, answers) if created else None
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('Could not save %s for user %s', questionnaire_type, user_id)
+        flash('Sorry, your answers could not be saved. Please try again.', 'danger')
+        return redirect(url_for(endpoint))
+
+    if created:
+        # Hand any alert to the alert workers (returns immediately)
+        dispatch_risk_alerts([risk_alert])
+        flash(f'{name} questionnaire completed successfully!', 'success')
+    return redirect(url_for('complete', q_type=endpoint))
+
+
+def claim_completion(user_id, questionnaire_type):
+    """
+    Mark a questionnaire as completed for a user, in a way that is safe
+    when two submits arrive at the same moment (double-click, retry).
+
+    This is a single "INSERT ... ON CONFLICT DO NOTHING": the database's
+    unique constraint (_user_questionnaire_uc) decides who wins, so there
+    is no gap between checking and inserting. The loser waits for the
+    winner's transaction and then simply inserts nothing.
+
+    Returns the new completion's id, or None if the user had already
+    completed this questionnaire.
+    """
+    values = {'user_id': user_id,
+              'questionnaire_type': questionnaire_type,
+              'completed_at': datetime.utcnow()}
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        statement = dialect_insert(QuestionnaireCompletion).values(**values) \
+            .on_conflict_do_nothing(index_elements=['user_id', 'questionnaire_type']) \
+            .returning(QuestionnaireCompletion.id)
+        return db.session.execute(statement).scalar()
+
+    # Other databases: insert inside a savepoint and treat a unique
+    # constraint error as "already completed"
+    try:
+        with db.session.begin_nested():
+            result = db.session.execute(insert(QuestionnaireCompletion).values(**values))
+        return result.inserted_primary_key[0]
+    except IntegrityError:
+        return None
+
+
+def save_questionnaire(user_id, questionnaire_type, answers):
+    """
+    Save one validated questionnaire in the current transaction (the caller
+    commits). The completion is claimed FIRST, so a duplicate submit stops
+    before inserting any Response rows.
+
+    Returns (completion_id, created). If the questionnaire was already
+    completed, created is False and completion_id is the original one.
+    """
+    completion_id = claim_completion(user_id, questionnaire_type)
+    if completion_id is None:
+        original = QuestionnaireCompletion.query.filter_by(
+            user_id=user_id,
+            questionnaire_type=questionnaire_type
+        ).first()
+        return original.id, False
+
+    # All answers in one INSERT
+    db.session.execute(insert(Response), [
+        {
+            'user_id': user_id,
+            'questionnaire_type': questionnaire_type,
+            'question_number': q_num,
+            'rating': rating,
+            'explanation': explanation,
+            'submitted_at': datetime.utcnow()
+        }
+        for q_num, rating, explanation in answers
+    ])
+    return completion_id, True
+
+
+def save_submission_batch(user_id, submissions):
+    """
+    Save several questionnaires sent together by the offline client, in ONE
+    database transaction. Each submission carries an idempotency_key, so a
+    batch that is sent twice (e.g. the reply got lost) is only saved once.
+
+    Returns a list with one result per submission, in the same order:
+        {'idempotency_key': ..., 'status': 'created' | 'duplicate' |
+         'already_completed' | 'invalid' | 'forbidden', ...}
+    'created', 'duplicate' and 'already_completed' all include the
+    completion_id (for duplicates, the one saved the first time).
+    and the list of RiskAlert rows to hand to dispatch_risk_alerts().
+    """
+    keys = [s.get('idempotency_key') for s in submissions if isinstance(s, dict)]
+    receipts = {r.idempotency_key: r for r in SubmissionReceipt.query.filter(
+        SubmissionReceipt.idempotency_key.in_([k for k in keys if isinstance(k, str)]))}
+    completed = {c.questionnaire_type: c.id for c in
+                 QuestionnaireCompletion.query.filter_by(user_id=user_id)}
+
+    results = []
+    risk_alerts = []
+    for item in submissions:
+        if not isinstance(item, dict):
+            results.append({'idempotency_key': None, 'status': 'invalid',
+                            'error': 'Each submission must be an object.'})
+            continue
+        key = item.get('idempotency_key')
+        q_type = item.get('questionnaire_type')
+        result = {'idempotency_key': key, 'questionnaire_type': q_type}
+        results.append(result)
+
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            result.update(status='invalid', error='idempotency_key must be a string of 1-64 characters.')
+            continue
+
+        # Seen this key before (in an earlier batch or earlier in this one)?
+        if key in receipts:
+            receipt = receipts[key]
+            if receipt.user_id != user_id:
+                result.update(status='forbidden', error='This submission belongs to another user.')
+            else:
+                result.update(status='duplicate', completion_id=receipt.completion_id)
+            continue
+
+        # The browser records who filled in the form; don't save it for someone else
+        if item.get('user_id') is not None and item.get('user_id') != user_id:
+            result.update(status='forbidden', error='This submission belongs to another user.')
+            continue
+
+        if not isinstance(q_type, str) or q_type not in QUESTIONNAIRES:
+            result.update(status='invalid', error=f'Unknown questionnaire_type: {q_type!r}.')
+            continue
+        if q_type in completed:
+            result.update(status='already_completed', completion_id=completed[q_type])
+            continue
+
+        try:
+            answers = validate_answers(q_type, item.get('answers'))
+        except ValueError as e:
+            result.update(status='invalid', error=str(e))
+            continue
+
+        completion_id, was_created = save_questionnaire(user_id, q_type, answers)
+        completed[q_type] = completion_id
+        if not was_created:
+            # Another request completed it a moment ago
+            result.update(status='already_completed', completion_id=completion_id)
+            continue
+        receipt = SubmissionReceipt(idempotency_key=key, user_id=user_id,
+                                    questionnaire_type=q_type,
+                                    completion_id=completion_id)
+        db.session.add(receipt)
+        receipts[key] = receipt
+        result.update(status='created', completion_id=completion_id)
+        risk_alerts.append(record_risk_alert(user_id, q_type, answers))
+
+    # Save everything to database at once
+    db.session.commit()
+    return results, risk_alerts
+
+
+def record_risk_alert(user_id, questionnaire_type, answers):
+    """
+    Check a newly saved questionnaire against the alert rules (alerts.py).
+    If a rule matches, add a pending RiskAlert row to the current
+    transaction, so the alert is saved together with the answers.
+    Returns the RiskAlert, or None if no rule matched.
+    """
+    alert = alert_dispatcher.evaluate({
+        'user_id': user_id,
+        'questionnaire_type': questionnaire_type,
+        'ratings': {q_num: rating for q_num, rating, _ in answers},
+        'submitted_at': datetime.utcnow().isoformat()
+    })
+    if alert is None:
+        return None
+    alert['username'] = db.session.get(User, user_id).username
+    risk_alert = RiskAlert(user_id=user_id, questionnaire_type=questionnaire_type,
+                           payload=json.dumps(alert))
+    db.session.add(risk_alert)
+    return risk_alert
+
+
+def dispatch_risk_alerts(risk_alerts):
+    """
+    Hand saved RiskAlert rows to the alert workers (call this after commit).
+    Sinks that already received an alert are skipped. Alerts that can't be
+    queued stay pending and are sent again later.
+    """
+    risk_alerts = [r for r in risk_alerts if r is not None]
+    delivered = {}
+    if risk_alerts:
+        for d in AlertDelivery.query.filter(
+                AlertDelivery.risk_alert_id.in_([r.id for r in risk_alerts])):
+            delivered.setdefault(d.risk_alert_id, []).append(d.sink)
+    for risk_alert in risk_alerts:
+        alert = json.loads(risk_alert.payload)
+        alert['id'] = risk_alert.id
+        alert['delivered_sinks'] = delivered.get(risk_alert.id, [])
+        alert_dispatcher.submit(alert)
+
+
+def mark_sink_delivered(alert, sink):
+    """Called by the alert workers each time one sink accepted an alert."""
+    with app.app_context():
+        db.session.add(AlertDelivery(risk_alert_id=alert['id'], sink=sink))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # already recorded
+
+
+def mark_alert_delivered(alert):
+    """Called by the alert workers once an alert reached every sink."""
+    with app.app_context():
+        RiskAlert.query.filter_by(id=alert['id']).update({'delivered_at': datetime.utcnow()})
+        db.session.commit()
+
+
+def requeue_pending_alerts():
+    """
+    Send again every alert that was never delivered (for example because
+    the app stopped while it was queued). Runs once per process, on its
+    first request (see below) - not at import time, because with
+    debug=True the reloader imports this file in two processes.
+    """
+    pending = RiskAlert.query.filter(RiskAlert.delivered_at.is_(None)) \
+        .order_by(RiskAlert.id).all()
+    if pending:
+        print(f"Re-sending {len(pending)} undelivered risk alert(s)...")
+        dispatch_risk_alerts(pending)
+
+
+_alerts_requeued = False
+_alerts_requeue_lock = threading.Lock()
+
+
+@app.before_request
+def requeue_pending_alerts_once():
+    """Re-send leftover alerts the first time this process handles a request."""
+    global _alerts_requeued
+    if _alerts_requeued:
+        return
+    with _alerts_requeue_lock:
+        if not _alerts_requeued:
+            _alerts_requeued = True
+            requeue_pending_alerts()
+
+
+def save_submissions_with_retry(user_id, submissions):
+    """
+    Call save_submission_batch(), retrying once if another request saved
+    the same idempotency key at the same moment (the loser of that race
+    hits the unique constraint; on the retry it will see 'duplicate').
+    Returns (results, risk_alerts), or None if the conflict persisted.
+    """
+    for _ in range(2):
+        try:
+            return save_submission_batch(user_id, submissions)
+        except IntegrityError:
+            db.session.rollback()
+    return None
+
+
+def questionnaire_definitions():
+    """
+    Build the JSON description of every questionnaire (questions and scales).
+    """
+    return {'questionnaires': [
+        {
+            'type': q_type,
+            'questions': [{'number': num, 'text': text}
+                          for num, text in questionnaire['questions'].items()],
+            'scale': [{'value': value, 'label': label}
+                      for value, label in questionnaire['scale'].items()]
+        }
+        for q_type, questionnaire in QUESTIONNAIRES.items()
+    ]}
+
+
+# The questionnaire definitions never change while the app runs, so their
+# JSON and ETag are built once. Clients send the ETag back in If-None-Match
+# and get a tiny "304 Not Modified" instead of the full definitions.
+QUESTIONNAIRES_JSON = json.dumps(questionnaire_definitions())
+QUESTIONNAIRES_ETAG = hashlib.sha256(QUESTIONNAIRES_JSON.encode('utf-8')).hexdigest()[:32]
+
+
 # ROUTES (URL Endpoints)
 # Each route handles a different page or action in our app
 
@@ -159,10 +596,15 @@ def logout():
     """
     LOGOUT
     Clear the session (log user out) and redirect to login page.
+    Also tells the browser to delete anything the offline client stored
+    (queued answers, cached files), so the next participant on a shared
+    device can't see or send them.
     """
     session.clear()
     flash('You have been logged out successfully.', 'info')
-    return redirect(url_for('login'))
+    response = redirect(url_for('login'))
+    response.headers['Clear-Site-Data'] = '"cache", "storage"'
+    return response
 
 
 @app.route('/dashboard')
@@ -189,6 +631,11 @@ def swls():
     GET: Show the questionnaire form
     POST: Save responses and mark as complete
     """
+    if request.method == 'POST':
+        # Process the submitted questionnaire
+        # (no "already completed" check first - saving claims the completion atomically)
+        return submit_questionnaire_form('SWLS', 'swls', 'SWLS')
+    
     user_id = session['user_id']
     
     # Check if already completed
@@ -201,47 +648,6 @@ def swls():
         flash('You have already completed the SWLS questionnaire.', 'info')
         return redirect(url_for('dashboard'))
     
-    if request.method == 'POST':
-        # Process the submitted questionnaire
-        try:
-            # Loop through each question and save the response
-            for q_num in range(1, 6):  # SWLS has 5 questions
-                rating = request.form.get(f'q{q_num}_rating')
-                explanation = request.form.get(f'q{q_num}_explanation')
-                
-                # Validate that both rating and explanation are provided
-                if not rating or not explanation:
-                    flash(f'Please complete question {q_num} (both rating and explanation).', 'danger')
-                    return redirect(url_for('swls'))
-                
-                # Create a new Response record
-                response = Response(
-                    user_id=user_id,
-                    questionnaire_type='SWLS',
-                    question_number=q_num,
-                    rating=int(rating),
-                    explanation=explanation.strip()
-                )
-                db.session.add(response)
-            
-            # Mark questionnaire as completed
-            completion = QuestionnaireCompletion(
-                user_id=user_id,
-                questionnaire_type='SWLS'
-            )
-            db.session.add(completion)
-            
-            # Save everything to database
-            db.session.commit()
-            
-            flash('SWLS questionnaire completed successfully!', 'success')
-            return redirect(url_for('complete', q_type='swls'))
-            
-        except Exception as e:
-            db.session.rollback()
-            flash(f'An error occurred: {str(e)}', 'danger')
-            return redirect(url_for('swls'))
-    
     # Show the questionnaire form
     return render_template('swls.html', 
                          questions=SWLS_QUESTIONS,
@@ -256,6 +662,11 @@ def phq9():
     GET: Show the questionnaire form
     POST: Save responses and mark as complete
     """
+    if request.method == 'POST':
+        # Process the submitted questionnaire
+        # (no "already completed" check first - saving claims the completion atomically)
+        return submit_questionnaire_form('PHQ9', 'phq9', 'PHQ-9')
+    
     user_id = session['user_id']
     
     # Check if already completed
@@ -268,47 +679,6 @@ def phq9():
         flash('You have already completed the PHQ-9 questionnaire.', 'info')
         return redirect(url_for('dashboard'))
     
-    if request.method == 'POST':
-        # Process the submitted questionnaire
-        try:
-            # Loop through each question and save the response
-            for q_num in range(1, 10):  # PHQ-9 has 9 questions
-                rating = request.form.get(f'q{q_num}_rating')
-                explanation = request.form.get(f'q{q_num}_explanation')
-                
-                # Validate that both rating and explanation are provided
-                if not rating or not explanation:
-                    flash(f'Please complete question {q_num} (both rating and explanation).', 'danger')
-                    return redirect(url_for('phq9'))
-                
-                # Create a new Response record
-                response = Response(
-                    user_id=user_id,
-                    questionnaire_type='PHQ9',
-                    question_number=q_num,
-                    rating=int(rating),
-                    explanation=explanation.strip()
-                )
-                db.session.add(response)
-            
-            # Mark questionnaire as completed
-            completion = QuestionnaireCompletion(
-                user_id=user_id,
-                questionnaire_type='PHQ9'
-            )
-            db.session.add(completion)
-            
-            # Save everything to database
-            db.session.commit()
-            
-            flash('PHQ-9 questionnaire completed successfully!', 'success')
-            return redirect(url_for('complete', q_type='phq9'))
-            
-        except Exception as e:
-            db.session.rollback()
-            flash(f'An error occurred: {str(e)}', 'danger')
-            return redirect(url_for('phq9'))
-    
     # Show the questionnaire form
     return render_template('phq9.html', 
                          questions=PHQ9_QUESTIONS,
@@ -328,6 +698,223 @@ def complete(q_type):
                          questionnaire_name=questionnaire_name)
 
 
+@app.route('/service-worker.js')
+def service_worker():
+    """
+    OFFLINE SERVICE WORKER
+    Served from the root URL (not /static/) so the browser lets it work
+    for every page of the app. See static/js/sw.js.
+    """
+    response = send_from_directory(os.path.join(app.root_path, 'static', 'js'), 'sw.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# JSON API
+# Used by the offline client (static/js/offline-queue.js) and other tools
+
+@app.route('/api/v1/submissions/batch', methods=['POST'])
+@api_login_required
+def submit_batch():
+    """
+    BATCH SUBMISSION API
+    POST a JSON body like:
+        {"submissions": [{"idempotency_key": "...", "questionnaire_type": "PHQ9",
+                          "answers": [{"question_number": 1, "rating": 2,
+                                       "explanation": "..."}, ...]}, ...]}
+    All questionnaires are saved in one transaction. Sending the same
+    idempotency_key again returns 'duplicate' instead of saving twice.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('submissions'), list):
+        return jsonify({'error': 'Expected a JSON object with a "submissions" list.'}), 400
+    submissions = data['submissions']
+    if len(submissions) > app.config['MAX_BATCH_SUBMISSIONS']:
+        return jsonify({'error': f"At most {app.config['MAX_BATCH_SUBMISSIONS']} "
+                                 f"submissions per batch."}), 400
+
+    saved = save_submissions_with_retry(g.api_user.id, submissions)
+    if saved is None:
+        return jsonify({'error': 'Conflicting submission, please retry.'}), 409
+    results, risk_alerts = saved
+    dispatch_risk_alerts(risk_alerts)
+
+    return jsonify({'results': results})
+
+
+@app.route('/api/v1/tokens', methods=['POST'])
+def create_api_token():
+    """
+    API LOGIN
+    POST {"username": "...", "password": "..."} to get a token for the
+    "Authorization: Bearer <token>" header. The token is shown only once.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+    username = data.get('username')
+    password = data.get('password')
+    if not isinstance(username, str) or not isinstance(password, str):
+        return jsonify({'error': 'username and password must be strings.'}), 400
+
+    user = User.query.filter_by(username=username).first()
+    if not user or not user.check_password(password):
+        return jsonify({'error': 'Invalid username or password.'}), 401
+
+    api_token, token = ApiToken.issue(user)
+    db.session.add(api_token)
+    db.session.commit()
+    return jsonify({'token': token,
+                    'expires_in': app.config['API_TOKEN_LIFETIME']}), 201
+
+
+@app.route('/api/v1/tokens/current', methods=['DELETE'])
+@api_login_required
+def revoke_api_token():
+    """
+    API LOGOUT
+    Delete the token used for this request so it can't be used again.
+    """
+    token = g.get('api_token')
+    if token is None:
+        return jsonify({'error': 'This request was not made with a token.'}), 400
+    db.session.delete(token)
+    db.session.commit()
+    return '', 204
+
+
+@app.route('/api/v1/questionnaires')
+def api_questionnaires():
+    """
+    QUESTIONNAIRE DEFINITIONS
+    Returns all questions and rating scales. Supports conditional GET:
+    send the ETag back in If-None-Match to get "304 Not Modified".
+    """
+    response = app.response_class(QUESTIONNAIRES_JSON, mimetype='application/json')
+    response.set_etag(QUESTIONNAIRES_ETAG, weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['API_DEFINITIONS_MAX_AGE']
+    return response.make_conditional(request)
+
+
+@app.route('/api/v1/me/completions')
+@api_login_required
+def api_my_completions():
+    """
+    MY COMPLETIONS
+    Lists the questionnaires the logged-in user has completed.
+    """
+    completions = QuestionnaireCompletion.query.filter_by(user_id=g.api_user.id) \
+        .order_by(QuestionnaireCompletion.id).all()
+    return jsonify({'completions': [
+        {
+            'id': c.id,
+            'questionnaire_type': c.questionnaire_type,
+            'completed_at': c.completed_at.isoformat()
+        }
+        for c in completions
+    ]})
+
+
+@app.route('/api/v1/submissions', methods=['POST'])
+@api_login_required
+def api_submit():
+    """
+    SUBMIT ONE QUESTIONNAIRE
+    POST {"questionnaire_type": "SWLS", "answers": [...]} (same answer format
+    as the batch API). One round trip: the reply is the saved completion.
+    If the questionnaire was already completed, the reply is 200 with the
+    original completion_id. An optional Idempotency-Key header (or
+    "idempotency_key" field) makes retries safe.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+    submission = dict(data)
+    submission['idempotency_key'] = (request.headers.get('Idempotency-Key')
+                                     or data.get('idempotency_key')
+                                     or uuid.uuid4().hex)
+
+    saved = save_submissions_with_retry(g.api_user.id, [submission])
+    if saved is None:
+        return jsonify({'error': 'Conflicting submission, please retry.'}), 409
+    results, risk_alerts = saved
+    dispatch_risk_alerts(risk_alerts)
+
+    result = results[0]
+    # Submitting a questionnaire the user already completed is not an error:
+    # the reply is the original completion, like a repeated request
+    status_codes = {'created': 201, 'duplicate': 200, 'already_completed': 200,
+                    'invalid': 400, 'forbidden': 403}
+    return jsonify(result), status_codes[result['status']]
+
+
+@app.route('/api/v1/responses')
+@api_admin_required
+def api_responses():
+    """
+    ALL RESPONSES (researchers only)
+    Returns responses ordered by id, one page at a time. To get the next
+    page, pass the "next_after_id" from the previous reply as ?after_id=.
+    This "keyset" paging stays fast on big tables, unlike page numbers,
+    because the database jumps straight to the right id using the index.
+    Optional filters: ?questionnaire_type=PHQ9, ?user_id=3, ?limit=500
+    """
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        limit = int(request.args.get('limit', app.config['API_PAGE_SIZE']))
+        user_id = int(request.args['user_id']) if request.args.get('user_id') else None
+    except ValueError:
+        return jsonify({'error': 'after_id, limit and user_id must be integers.'}), 400
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+    query = Response.query.filter(Response.id > after_id)
+    if request.args.get('questionnaire_type'):
+        query = query.filter(Response.questionnaire_type == request.args['questionnaire_type'])
+    if user_id is not None:
+        query = query.filter(Response.user_id == user_id)
+    # Ask for one extra row to find out whether there is another page
+    rows = query.order_by(Response.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return jsonify({
+        'responses': [
+            {
+                'id': r.id,
+                'user_id': r.user_id,
+                'questionnaire_type': r.questionnaire_type,
+                'question_number': r.question_number,
+                'rating': r.rating,
+                'explanation': r.explanation,
+                'submitted_at': r.submitted_at.isoformat()
+            }
+            for r in rows
+        ],
+        'next_after_id': rows[-1].id if has_more else None
+    })
+
+
+@app.after_request
+def compress_api_response(response):
+    """
+    Gzip large JSON API replies when the client says it accepts gzip.
+    Questionnaire explanations are text, so this usually makes
+    response pages several times smaller.
+    """
+    if (request.path.startswith('/api/')
+            and response.status_code == 200
+            and not response.direct_passthrough
+            and request.accept_encodings['gzip']
+            and 'Content-Encoding' not in response.headers
+            and (response.content_length or 0) >= app.config['API_COMPRESS_MIN_SIZE']):
+        response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    if request.path.startswith('/api/'):
+        response.vary.add('Accept-Encoding')
+    return response
+
+
 # DATABASE INITIALIZATION
 # This creates all the tables when the app first runs
 
@@ -0,0 +1,314 @@
+"""
+BENCHMARK SUITE
+This script measures how fast the main parts of the app are when the
+database holds a realistic amount of data. It fills a SEPARATE database
+(instance/benchmark.db) with synthetic participants for each scale, times
+each operation, and writes the results to a JSON file.
+
+Operations measured:
+- login:             POST /login with a valid username and password
+- dashboard:         GET /dashboard for a logged-in participant
+- submit:            POST /swls with a complete questionnaire
+- completion_lookup: get_user_completion_status() for one participant
+- export:            read every response and write it as CSV (like the README example)
+- duplicate_submit:  many threads POST the same questionnaire for ONE user at
+                     once (a double-click storm); checks that exactly one
+                     completion and no extra Response rows were saved, that
+                     every request landed on the completion page, and that
+                     no request took longer than --max-latency seconds
+
+HOW TO USE:
+    python benchmark.py                           # 1k, 100k and 1M response rows
+    python benchmark.py --scales 1000 --rounds 20 # quick run
+    python benchmark.py --output results.json
+    python benchmark.py --check-duplicates        # only the double-submit check, on an empty DB
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Each fully-completed participant has 5 SWLS + 9 PHQ-9 responses
+RESPONSES_PER_USER = 14
+
+# Slowest a single request may be in the duplicate-submit check (seconds)
+DEFAULT_MAX_LATENCY = 1.0
+
+DEFAULT_SCALES = [1000, 100000, 1000000]
+
+
+def measure(func, rounds, setup=None):
+    """
+    Call func() `rounds` times and return timing statistics in seconds.
+    If setup is given, it is called before each round (not timed) and its
+    return value is passed to func.
+    """
+    timings = []
+    for _ in range(rounds):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg) if setup else func()
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        'rounds': rounds,
+        'min': timings[0],
+        'max': timings[-1],
+        'mean': statistics.mean(timings),
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if rounds > 1 else 0.0,
+        'p95': timings[min(rounds - 1, int(rounds * 0.95))],
+    }
+
+
+def measure_duplicate_submit(app, user_id, form, threads=20, max_latency=DEFAULT_MAX_LATENCY):
+    """
+    Send the same SWLS questionnaire for one user from many threads at the
+    same moment. Returns the latency statistics plus the number of
+    completions and Response rows saved (should be 1 and 5) and raises
+    AssertionError if duplicates or orphan rows were stored, if any request
+    did not end on the completion page (e.g. "database is locked" sends it
+    back to the form), or if any request took longer than max_latency.
+    """
+    from models import Response, QuestionnaireCompletion
+
+    barrier = threading.Barrier(threads)
+    timings = []
+    statuses = []
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = f'synthetic_{user_id:07d}'
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.post('/swls', data=form)
+        elapsed = time.perf_counter() - start
+        with lock:
+            timings.append(elapsed)
+            statuses.append(response.headers.get('Location', ''))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    with app.app_context():
+        completions = QuestionnaireCompletion.query.filter_by(
+            user_id=user_id, questionnaire_type='SWLS').count()
+        responses = Response.query.filter_by(user_id=user_id, questionnaire_type='SWLS').count()
+
+    timings.sort()
+    stats = {
+        'rounds': threads,
+        'min': timings[0],
+        'max': timings[-1],
+        'mean': statistics.mean(timings),
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if threads > 1 else 0.0,
+        'p95': timings[min(threads - 1, int(threads * 0.95))],
+        'completions': completions,
+        'responses': responses,
+        'all_redirected_to_complete': all(s.endswith('/complete/swls') for s in statuses),
+    }
+    assert completions == 1, f'{completions} completions saved for one user'
+    assert responses == 5, f'{responses} SWLS responses saved (expected 5)'
+    assert stats['all_redirected_to_complete'], f'Some requests did not complete: {statuses}'
+    assert stats['max'] <= max_latency, \
+        f"Slowest request took {stats['max']:.3f}s (limit {max_latency}s)"
+    return stats
+
+
+def check_duplicates(app, threads, max_latency):
+    """
+    Run only the duplicate-submit check, on an empty database with a single
+    participant. Quick enough to run after every change.
+    """
+    from app import SWLS_QUESTIONS
+    from generate_synthetic_data import clear_dataset, generate_dataset
+
+    with app.app_context():
+        clear_dataset()
+        generate_dataset(1, completion_rate=0.0)
+
+    form = {}
+    for q_num in SWLS_QUESTIONS:
+        form[f'q{q_num}_rating'] = '4'
+        form[f'q{q_num}_explanation'] = 'Benchmark explanation text.'
+    stats = measure_duplicate_submit(app, 1, form, threads=threads, max_latency=max_latency)
+    print(f'✓ {threads} simultaneous submits: {stats["completions"]} completion, '
+          f'{stats["responses"]} responses, slowest {stats["max"] * 1000:.1f} ms')
+    return stats
+
+
+def run_scale(app, rows, rounds, seed, max_latency=DEFAULT_MAX_LATENCY):
+    """
+    Fill the database with about `rows` response rows and benchmark every
+    operation against it. Returns a list of result dictionaries.
+    """
+    from models import db, Response
+    from app import get_user_completion_status, SWLS_QUESTIONS
+    from generate_synthetic_data import (clear_dataset, generate_dataset,
+                                         SYNTHETIC_PASSWORD)
+
+    n_users = max(1, rows // RESPONSES_PER_USER)
+    rng = random.Random(seed)
+
+    with app.app_context():
+        print(f'\n[{rows} rows] Generating {n_users} participants...')
+        clear_dataset()
+        start = time.perf_counter()
+        generate_dataset(n_users, seed=seed)
+        # Extra participants with nothing completed yet, used by the submit benchmark
+        first_fresh_id = n_users + 1
+        generate_dataset(rounds + 1, seed=seed + 1, completion_rate=0.0)
+        print(f'[{rows} rows] Generated in {time.perf_counter() - start:.1f}s')
+
+    client = app.test_client()
+    results = []
+
+    def record(name, stats):
+        print(f'[{rows} rows] {name:<18} median {stats["median"] * 1000:8.2f} ms   '
+              f'p95 {stats["p95"] * 1000:8.2f} ms')
+        results.append({
+            'name': f'{name}[{rows}]',
+            'group': name,
+            'params': {'rows': rows, 'users': n_users},
+            'stats': stats,
+        })
+
+    def username(user_id):
+        return f'synthetic_{user_id:07d}'
+
+    def log_in_as(user_id):
+        # Put the user straight into the session (skips the slow password check)
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = username(user_id)
+
+    def random_user_id():
+        return rng.randint(1, n_users)
+
+    # LOGIN
+    def do_login(name):
+        client.post('/login', data={'username': name, 'password': SYNTHETIC_PASSWORD})
+
+    def prepare_login():
+        client.get('/logout')
+        return username(random_user_id())
+    record('login', measure(do_login, rounds, setup=prepare_login))
+
+    # DASHBOARD
+    def prepare_dashboard():
+        log_in_as(random_user_id())
+    record('dashboard', measure(lambda _: client.get('/dashboard'), rounds,
+                                setup=prepare_dashboard))
+
+    # SUBMIT
+    form = {}
+    for q_num in SWLS_QUESTIONS:
+        form[f'q{q_num}_rating'] = '4'
+        form[f'q{q_num}_explanation'] = 'Benchmark explanation text.'
+    fresh_ids = iter(range(first_fresh_id, first_fresh_id + rounds + 1))
+
+    def prepare_submit():
+        log_in_as(next(fresh_ids))
+    record('submit', measure(lambda _: client.post('/swls', data=form), rounds,
+                             setup=prepare_submit))
+
+    # COMPLETION LOOKUP
+    with app.app_context():
+        record('completion_lookup',
+               measure(get_user_completion_status, rounds, setup=random_user_id))
+
+    # DUPLICATE SUBMIT (concurrency check)
+    record('duplicate_submit', measure_duplicate_submit(app, next(fresh_ids), form,
+                                                        max_latency=max_latency))
+
+    # EXPORT (fewer rounds - this reads the whole table)
+    def do_export():
+        with app.app_context():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['User ID', 'Questionnaire', 'Question', 'Rating', 'Explanation'])
+            query = db.session.query(Response.user_id, Response.questionnaire_type,
+                                     Response.question_number, Response.rating,
+                                     Response.explanation).yield_per(10000)
+            for row in query:
+                writer.writerow(row)
+    record('export', measure(do_export, max(1, min(rounds, 3))))
+
+    return results
+
+
+def main():
+    """
+    Main function - runs when the script is executed.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the questionnaire app at realistic scale.')
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help='comma-separated numbers of response rows (default: 1000,100000,1000000)')
+    parser.add_argument('--rounds', type=int, default=50, help='timed rounds per operation')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the synthetic data')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--database', default=None,
+                        help='SQLite file to use (default: instance/benchmark.db) - it is wiped!')
+    parser.add_argument('--check-duplicates', action='store_true',
+                        help='only run the duplicate-submit check on an empty database')
+    parser.add_argument('--threads', type=int, default=20,
+                        help='simultaneous submits in the duplicate-submit check')
+    parser.add_argument('--max-latency', type=float, default=DEFAULT_MAX_LATENCY,
+                        help='slowest allowed request in the duplicate-submit check (seconds)')
+    args = parser.parse_args()
+
+    # Point the app at a separate database BEFORE importing it,
+    # so the real study data is never touched
+    basedir = os.path.abspath(os.path.dirname(__file__))
+    database = args.database or os.path.join(basedir, 'instance', 'benchmark.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+
+    from app import app
+
+    if args.check_duplicates:
+        try:
+            check_duplicates(app, args.threads, args.max_latency)
+        except AssertionError as e:
+            print(f'✗ Duplicate-submit check failed: {e}')
+            sys.exit(1)
+        return
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    benchmarks = []
+    for rows in scales:
+        benchmarks.extend(run_scale(app, rows, args.rounds, args.seed, args.max_latency))
+
+    output = {
+        'machine_info': {
+            'python_version': sys.version.split()[0],
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+        },
+        'datetime': datetime.utcnow().isoformat(),
+        'database': database,
+        'benchmarks': benchmarks,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f'\n✓ Results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -33,3 +33,37 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True  # Protect cookies from JavaScript access
     SESSION_COOKIE_SAMESITE = 'Lax'  # CSRF protection
     PERMANENT_SESSION_LIFETIME = 3600  # Session expires after 1 hour (3600 seconds)
+    
+    # RISK ALERT CONFIGURATION (see alerts.py)
+    # Alerts are sent when PHQ-9 question 9 is rated at or above this value
+    ALERT_PHQ9_ITEM9_MIN_RATING = 1
+    # Extra alerts on total scores, as (direction, threshold) pairs:
+    # ('>=', 20) on PHQ9 is severe depression; add 'SWLS': ('<=', 9) to also
+    # alert on "extremely dissatisfied" life satisfaction scores
+    ALERT_TOTAL_THRESHOLDS = {'PHQ9': ('>=', 20)}
+    # Where alerts are delivered - leave a setting empty to disable that sink
+    ALERT_LOG_FILE = os.environ.get('ALERT_LOG_FILE') or os.path.join(basedir, 'instance', 'alerts.log')
+    ALERT_WEBHOOK_URL = os.environ.get('ALERT_WEBHOOK_URL')
+    ALERT_SMTP_HOST = os.environ.get('ALERT_SMTP_HOST') or 'localhost'
+    ALERT_SMTP_PORT = int(os.environ.get('ALERT_SMTP_PORT') or 1025)
+    ALERT_SMTP_SENDER = os.environ.get('ALERT_SMTP_SENDER') or 'alerts@localhost'
+    ALERT_SMTP_RECIPIENTS = [r for r in (os.environ.get('ALERT_SMTP_RECIPIENTS') or '').split(',') if r]
+    # Background workers that send alerts (so submitting stays fast)
+    ALERT_WORKERS = 2
+    ALERT_QUEUE_SIZE = 1000
+    ALERT_MAX_RETRIES = 3
+    ALERT_RETRY_DELAY = 1.0  # seconds, grows with each retry
+    ALERT_SHUTDOWN_TIMEOUT = 10  # seconds to finish sending alerts when the app stops
+    
+    # OFFLINE SYNC
+    # Maximum number of questionnaires the browser may send in one batch
+    MAX_BATCH_SUBMISSIONS = 20
+    
+    # JSON API
+    # Researchers allowed to read everyone's responses via /api/v1/responses
+    ADMIN_USERNAMES = [u for u in (os.environ.get('ADMIN_USERNAMES') or '').split(',') if u]
+    API_TOKEN_LIFETIME = 30 * 24 * 3600  # API tokens expire after 30 days (in seconds)
+    API_PAGE_SIZE = 100  # Responses per page by default
+    API_MAX_PAGE_SIZE = 1000  # Largest page a client may ask for
+    API_DEFINITIONS_MAX_AGE = 3600  # How long clients may cache the questionnaire definitions
+    API_COMPRESS_MIN_SIZE = 1024  # Only gzip replies bigger than this (in bytes)
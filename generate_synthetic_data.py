@@ -0,0 +1,219 @@
+"""
+SYNTHETIC DATA GENERATOR
+This script fills the database with fake participants who have already
+answered the questionnaires. It is meant for testing and benchmarking
+(see benchmark.py) - NEVER run it against the real study database.
+
+The fake answers look like real ones:
+- PHQ-9 scores are mostly low, with a long tail of higher scores
+- Items within a questionnaire are correlated (a person who is "down" on one
+  item tends to be down on the others)
+- SWLS scores go down when PHQ-9 scores go up
+- Explanations have different lengths, from a few words to a few sentences
+
+HOW TO USE:
+    python generate_synthetic_data.py --users 1000 --seed 42
+"""
+
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, func
+from werkzeug.security import generate_password_hash
+
+# Every synthetic participant gets this password, so login can be benchmarked.
+# It is hashed only once because hashing is deliberately slow.
+SYNTHETIC_PASSWORD = 'synthetic-password'
+
+# How many rows to send to the database in one INSERT
+BATCH_SIZE = 5000
+
+# Words used to build the free-text explanations
+EXPLANATION_WORDS = (
+    'i feel like work has been busy and sleep is hard some days but my family '
+    'helps me a lot when things get difficult mostly fine recently tired '
+    'stressed about money friends weekend exercise walking better worse than '
+    'usual last two weeks trying to stay positive nothing really changed '
+    'appetite energy focus motivation hopeful lonely calm anxious'
+).split()
+
+
+def clamp(value, low, high):
+    """Keep a number between low and high."""
+    return max(low, min(high, value))
+
+
+def generate_explanation(rng):
+    """
+    Make a fake explanation between a few words and a few sentences long.
+    Lengths follow a log-normal distribution, like real free-text answers.
+    """
+    n_words = int(clamp(rng.lognormvariate(2.5, 0.7), 3, 150))
+    words = rng.choices(EXPLANATION_WORDS, k=n_words)
+    return ' '.join(words).capitalize() + '.'
+
+
+def generate_participant_ratings(rng):
+    """
+    Make correlated SWLS (1-7) and PHQ-9 (0-3) ratings for one participant.
+    A hidden "distress" level drives both questionnaires, so the scores
+    are realistic and related to each other.
+
+    Returns a tuple (swls_ratings, phq9_ratings), each a list of ints.
+    """
+    # Most people have low distress; a few have high distress
+    distress = rng.gammavariate(1.5, 0.45)
+
+    phq9 = []
+    for _ in range(9):
+        value = distress + rng.gauss(0, 0.6) - 0.3
+        phq9.append(int(clamp(round(value), 0, 3)))
+    # Question 9 (self-harm thoughts) is rarer than the other symptoms
+    phq9[8] = int(clamp(round(distress - 1.2 + rng.gauss(0, 0.5)), 0, 3))
+
+    satisfaction = 5.2 - 1.3 * distress
+    swls = [int(clamp(round(satisfaction + rng.gauss(0, 0.9)), 1, 7)) for _ in range(5)]
+
+    return swls, phq9
+
+
+def generate_dataset(n_users, seed=42, completion_rate=1.0, start_date=None):
+    """
+    Insert n_users synthetic participants and their answers into the database.
+    Must be called inside app.app_context().
+
+    Args:
+        n_users: How many participants to create
+        seed: Random seed (same seed = same data every time)
+        completion_rate: Fraction of participants who completed each questionnaire
+        start_date: Earliest submission date (default: 90 days ago)
+
+    Returns:
+        A dictionary with the number of users, responses and completions created
+    """
+    from models import db, User, Response, QuestionnaireCompletion
+
+    rng = random.Random(seed)
+    start_date = start_date or datetime.utcnow() - timedelta(days=90)
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+
+    # Give new users ids after the existing ones, so we don't need to
+    # read ids back from the database after every insert
+    first_id = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+
+    counts = {'users': 0, 'responses': 0, 'completions': 0}
+    users, responses, completions = [], [], []
+
+    def flush():
+        # Send the collected rows to the database in a few big INSERTs
+        if users:
+            db.session.execute(insert(User), users)
+        if responses:
+            db.session.execute(insert(Response), responses)
+        if completions:
+            db.session.execute(insert(QuestionnaireCompletion), completions)
+        db.session.commit()
+        counts['users'] += len(users)
+        counts['responses'] += len(responses)
+        counts['completions'] += len(completions)
+        users.clear()
+        responses.clear()
+        completions.clear()
+
+    for user_id in range(first_id, first_id + n_users):
+        created_at = start_date + timedelta(seconds=rng.randint(0, 86400))
+        users.append({
+            'id': user_id,
+            'username': f'synthetic_{user_id:07d}',
+            'password_hash': password_hash,
+            'created_at': created_at,
+        })
+
+        swls, phq9 = generate_participant_ratings(rng)
+        for q_type, ratings in (('SWLS', swls), ('PHQ9', phq9)):
+            if rng.random() >= completion_rate:
+                continue
+            submitted_at = created_at + timedelta(minutes=rng.randint(1, 60 * 24 * 60))
+            for q_num, rating in enumerate(ratings, start=1):
+                responses.append({
+                    'user_id': user_id,
+                    'questionnaire_type': q_type,
+                    'question_number': q_num,
+                    'rating': rating,
+                    'explanation': generate_explanation(rng),
+                    'submitted_at': submitted_at,
+                })
+            completions.append({
+                'user_id': user_id,
+                'questionnaire_type': q_type,
+                'completed_at': submitted_at,
+            })
+
+        if len(responses) >= BATCH_SIZE:
+            flush()
+
+    flush()
+    return counts
+
+
+def clear_dataset():
+    """
+    Delete ALL users, responses and completions, plus everything that points
+    at them (submission receipts, API tokens, risk alerts and their deliveries). Otherwise old
+    rows would refer to the recycled ids of the new synthetic users.
+    Must be called inside app.app_context().
+    """
+    from models import (db, User, Response, QuestionnaireCompletion,
+                        SubmissionReceipt, ApiToken, RiskAlert, AlertDelivery)
+    SubmissionReceipt.query.delete()
+    ApiToken.query.delete()
+    AlertDelivery.query.delete()
+    RiskAlert.query.delete()
+    Response.query.delete()
+    QuestionnaireCompletion.query.delete()
+    User.query.delete()
+    db.session.commit()
+
+
+def main():
+    """
+    Main function - runs when the script is executed.
+    """
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic questionnaire data.')
+    parser.add_argument('--users', type=int, default=1000, help='number of participants to create')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--completion-rate', type=float, default=1.0,
+                        help='fraction of participants who completed each questionnaire')
+    parser.add_argument('--clear', action='store_true', help='delete all existing data first')
+    parser.add_argument('--database', default=None,
+                        help='SQLite file to write to (default: instance/synthetic.db)')
+    args = parser.parse_args()
+
+    # Point the app at a separate database BEFORE importing it,
+    # so the real study data is never touched by accident
+    basedir = os.path.abspath(os.path.dirname(__file__))
+    database = args.database or os.path.join(basedir, 'instance', 'synthetic.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+
+    from app import app
+
+    with app.app_context():
+        if args.clear:
+            print('Clearing existing data...')
+            clear_dataset()
+        print(f'Creating {args.users} synthetic participants in {database}...')
+        start = time.perf_counter()
+        counts = generate_dataset(args.users, seed=args.seed,
+                                  completion_rate=args.completion_rate)
+        elapsed = time.perf_counter() - start
+
+    print(f"✓ Created {counts['users']} users, {counts['responses']} responses "
+          f"and {counts['completions']} completions in {elapsed:.1f}s")
+    print(f"  All synthetic users share the password '{SYNTHETIC_PASSWORD}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,8 @@ databases using Python classes instead of writing SQL queries.
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import hashlib
+import secrets
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Create a database instance that we'll use throughout the app
@@ -116,3 +118,140 @@ class QuestionnaireCompletion(db.Model):
     def __repr__(self):
         """String representation of the QuestionnaireCompletion object"""
         return f'<Completion user={self.user_id} type={self.questionnaire_type}>'
+
+
+class SubmissionReceipt(db.Model):
+    """
+    SUBMISSION RECEIPT TABLE
+    Remembers the idempotency key that came with each questionnaire sent
+    through the batch API. If the same submission is sent again (for example
+    after a flaky connection drops the reply), we recognise the key and
+    don't save the answers twice.
+    """
+    __tablename__ = 'submission_receipts'
+    
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Random key created by the browser for this submission (e.g. a UUID)
+    idempotency_key = db.Column(db.String(64), unique=True, nullable=False)
+    
+    # Which user sent it
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Which questionnaire it was ('SWLS' or 'PHQ9')
+    questionnaire_type = db.Column(db.String(10), nullable=False)
+    
+    # The completion that was created for this submission
+    completion_id = db.Column(db.Integer, db.ForeignKey('questionnaire_completions.id'), nullable=False)
+    
+    # When we received it
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        """String representation of the SubmissionReceipt object"""
+        return f'<Receipt key={self.idempotency_key} user={self.user_id}>'
+
+
+class RiskAlert(db.Model):
+    """
+    RISK ALERT TABLE
+    One row for every alert raised by alerts.py (e.g. PHQ-9 question 9
+    answered with 1 or more). The row is saved in the same transaction as
+    the answers, so an alert can't be lost: rows that were never delivered
+    are sent again when the app starts.
+    """
+    __tablename__ = 'risk_alerts'
+    
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Which user and questionnaire raised the alert
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    questionnaire_type = db.Column(db.String(10), nullable=False)
+    
+    # The alert itself as JSON (reasons, username, timestamps)
+    payload = db.Column(db.Text, nullable=False)
+    
+    # When it was raised, and when it reached every alert sink
+    # (empty = still pending)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, nullable=True, index=True)
+    
+    def __repr__(self):
+        """String representation of the RiskAlert object"""
+        return f'<RiskAlert user={self.user_id} type={self.questionnaire_type}>'
+
+
+class AlertDelivery(db.Model):
+    """
+    ALERT DELIVERY TABLE
+    Records which alert sinks (log file, email, webhook) already received
+    each RiskAlert, so re-sending a pending alert only goes to the sinks
+    that missed it.
+    """
+    __tablename__ = 'alert_deliveries'
+    
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Which alert, and which sink received it (e.g. 'webhook')
+    risk_alert_id = db.Column(db.Integer, db.ForeignKey('risk_alerts.id'), nullable=False)
+    sink = db.Column(db.String(20), nullable=False)
+    
+    # When it was delivered
+    delivered_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Each sink is recorded once per alert
+    __table_args__ = (db.UniqueConstraint('risk_alert_id', 'sink', name='_alert_sink_uc'),)
+    
+    def __repr__(self):
+        """String representation of the AlertDelivery object"""
+        return f'<AlertDelivery alert={self.risk_alert_id} sink={self.sink}>'
+
+
+class ApiToken(db.Model):
+    """
+    API TOKEN TABLE
+    Lets scripts and mobile apps use the JSON API without a browser session.
+    They send the token in a header: "Authorization: Bearer <token>".
+    Only a hash of the token is stored, just like passwords.
+    """
+    __tablename__ = 'api_tokens'
+    
+    # Primary key
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Which user this token belongs to
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # SHA-256 hash of the token (the token itself is only shown once)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    
+    # When the token was created (tokens expire after API_TOKEN_LIFETIME)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User')
+    
+    @staticmethod
+    def hash_token(token):
+        """
+        Hash a token for storage and lookup.
+        Tokens are long random strings, so a fast hash is enough here
+        (unlike passwords, they can't be guessed from a word list).
+        """
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def issue(cls, user):
+        """
+        Create a new token for a user.
+        Returns (ApiToken, token) - the plain token must be given to the user now,
+        because it can't be recovered from the database later.
+        """
+        token = secrets.token_urlsafe(32)
+        return cls(user_id=user.id, token_hash=cls.hash_token(token)), token
+    
+    def __repr__(self):
+        """String representation of the ApiToken object"""
+        return f'<ApiToken user={self.user_id}>'
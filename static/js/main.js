@@ -35,4 +35,142 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// OFFLINE SUPPORT
+// Questionnaires are saved in the browser first and then sent to the server
+// (see offline-queue.js), so a dropped Wi-Fi connection never loses answers.
+
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('/service-worker.js').catch(error => {
+        console.warn('Service worker registration failed:', error);
+    });
+}
+
+// Read the answers out of a questionnaire form
+function collectAnswers(form) {
+    const answers = [];
+    form.querySelectorAll('.explanation-textarea').forEach(textarea => {
+        const questionNumber = parseInt(textarea.name.match(/^q(\d+)_explanation$/)[1], 10);
+        const checked = form.querySelector(`input[name="q${questionNumber}_rating"]:checked`);
+        answers.push({
+            question_number: questionNumber,
+            rating: checked ? parseInt(checked.value, 10) : null,
+            explanation: textarea.value
+        });
+    });
+    return answers;
+}
+
+// Show a message above the form
+function showFormMessage(form, category, message) {
+    let alert = form.parentElement.querySelector('.offline-message');
+    if (!alert) {
+        alert = document.createElement('div');
+        alert.className = 'offline-message';
+        form.parentElement.insertBefore(alert, form);
+    }
+    alert.className = `alert alert-${category} offline-message`;
+    alert.textContent = message;
+    alert.scrollIntoView({ behavior: 'smooth' });
+}
+
+// Ask the service worker to send the queue once the browser is back online
+function requestBackgroundSync() {
+    if ('serviceWorker' in navigator && 'SyncManager' in window) {
+        navigator.serviceWorker.ready
+            .then(registration => registration.sync.register('submit-questionnaires'))
+            .catch(() => {});
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.OfflineQueue || !('indexedDB' in window)) {
+        return;  // Old browser: forms are posted the normal way
+    }
+
+    const userId = parseInt(document.body.dataset.userId, 10) || null;
+
+    document.querySelectorAll('form[data-questionnaire]').forEach(form => {
+        form.addEventListener('submit', async function(e) {
+            e.preventDefault();
+            const submitButton = form.querySelector('button[type="submit"]');
+            submitButton.disabled = true;
+
+            let item;
+            try {
+                item = await OfflineQueue.enqueue({
+                    user_id: userId,
+                    questionnaire_type: form.dataset.questionnaire,
+                    answers: collectAnswers(form)
+                });
+            } catch (error) {
+                // Storage not available (e.g. private browsing): post the form
+                // the normal way instead (form.submit() skips this handler)
+                form.submit();
+                return;
+            }
+
+            try {
+                const results = await OfflineQueue.sync();
+                let result = results[item.idempotency_key];
+                if (!result) {
+                    // Another tab, the online listener or the service worker may
+                    // have sent it first: if it left the queue, it was saved
+                    const waiting = await OfflineQueue.getAll();
+                    const stillQueued = waiting.some(
+                        queued => queued.idempotency_key === item.idempotency_key);
+                    result = stillQueued ? {} : { status: 'created' };
+                }
+                if (result.status === 'created' || result.status === 'duplicate') {
+                    window.location.href = form.dataset.completeUrl;
+                } else if (result.status === 'already_completed') {
+                    window.location.href = form.dataset.dashboardUrl;
+                } else {
+                    showFormMessage(form, 'danger', result.error || 'Your answers could not be saved. Please try again.');
+                    submitButton.disabled = false;
+                }
+            } catch (error) {
+                if (error.status === 401) {
+                    showFormMessage(form, 'warning',
+                        'Your session has expired. Your answers are saved on this device ' +
+                        'and will be sent after you log in again.');
+                    return;
+                }
+                // No connection (or server trouble): keep the answers in the browser
+                requestBackgroundSync();
+                showFormMessage(form, 'warning',
+                    'You seem to be offline. Your answers are saved on this device and ' +
+                    'will be sent automatically when the connection is back.');
+            }
+        });
+    });
+
+    // Logging out: send what is still waiting, then wipe this device's copy
+    // so the next participant on a shared device starts clean
+    const logoutLink = document.getElementById('logoutLink');
+    if (logoutLink) {
+        logoutLink.addEventListener('click', async function(e) {
+            e.preventDefault();
+            try {
+                await OfflineQueue.sync();
+            } catch (error) {
+                // Still offline - checked below
+            }
+            const waiting = await OfflineQueue.getAll();
+            if (waiting.length && !confirm(
+                    'Some of your answers have not been sent yet and will be deleted ' +
+                    'from this device if you log out now. Log out anyway?')) {
+                return;
+            }
+            await OfflineQueue.clear();
+            window.location.href = logoutLink.href;
+        });
+    }
+
+    // Send anything still waiting as soon as the connection returns
+    window.addEventListener('online', () => OfflineQueue.sync().catch(() => {}));
+    if (navigator.onLine) {
+        OfflineQueue.sync().catch(() => {});
+    }
+});
+
 // Add any additional JavaScript functionality here as needed
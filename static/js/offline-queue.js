@@ -0,0 +1,150 @@
+/*
+================================================================================
+OFFLINE SUBMISSION QUEUE
+================================================================================
+Completed questionnaires are first saved in the browser (IndexedDB) and then
+sent to the server with the batch API (/api/v1/submissions/batch). If the
+connection drops, nothing is lost: the queue is sent again later, either by
+the page (when the browser comes back online) or by the service worker.
+
+Every queued questionnaire has its own idempotency key, so sending the same
+one twice never saves it twice on the server.
+
+This file is used both by the pages (main.js) and by the service worker
+(sw.js), so it only uses features available in both.
+*/
+
+(function (global) {
+    const DB_NAME = 'questionnaire-offline';
+    const STORE_NAME = 'submissions';
+    const BATCH_URL = '/api/v1/submissions/batch';
+    const MAX_BATCH_SIZE = 20;  // must not exceed MAX_BATCH_SUBMISSIONS in config.py
+
+    // Results after which a queued questionnaire can be forgotten.
+    // 'forbidden' (filled in by a different user than the one logged in) is
+    // dropped too: it must never be saved under someone else's account.
+    const FINISHED_STATUSES = ['created', 'duplicate', 'already_completed', 'invalid', 'forbidden'];
+
+    let lastSync = Promise.resolve();
+
+    // Turn an IndexedDB request into a Promise
+    function promisify(request) {
+        return new Promise((resolve, reject) => {
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function openDatabase() {
+        const request = indexedDB.open(DB_NAME, 1);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(STORE_NAME, { keyPath: 'idempotency_key' });
+        };
+        return promisify(request);
+    }
+
+    async function withStore(mode, callback) {
+        const db = await openDatabase();
+        try {
+            const tx = db.transaction(STORE_NAME, mode);
+            const result = await callback(tx.objectStore(STORE_NAME));
+            await new Promise((resolve, reject) => {
+                tx.oncomplete = resolve;
+                tx.onerror = () => reject(tx.error);
+                tx.onabort = () => reject(tx.error);
+            });
+            return result;
+        } finally {
+            db.close();
+        }
+    }
+
+    function newIdempotencyKey() {
+        if (global.crypto && global.crypto.randomUUID) {
+            return global.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    }
+
+    // Save one completed questionnaire in the browser
+    async function enqueue(submission) {
+        const item = Object.assign({
+            idempotency_key: newIdempotencyKey(),
+            queued_at: new Date().toISOString()
+        }, submission);
+        await withStore('readwrite', store => promisify(store.put(item)));
+        return item;
+    }
+
+    function getAll() {
+        return withStore('readonly', store => promisify(store.getAll()));
+    }
+
+    function removeKeys(keys) {
+        return withStore('readwrite', store =>
+            Promise.all(keys.map(key => promisify(store.delete(key)))));
+    }
+
+    // Send everything currently in the queue once (see sync() below)
+    async function sendQueue() {
+        const results = {};
+        const queued = await getAll();
+        for (let i = 0; i < queued.length; i += MAX_BATCH_SIZE) {
+            const batch = queued.slice(i, i + MAX_BATCH_SIZE);
+            const response = await fetch(BATCH_URL, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    submissions: batch.map(item => ({
+                        idempotency_key: item.idempotency_key,
+                        user_id: item.user_id,
+                        questionnaire_type: item.questionnaire_type,
+                        answers: item.answers
+                    }))
+                })
+            });
+            if (!response.ok) {
+                const error = new Error('Sync failed with HTTP ' + response.status);
+                error.status = response.status;
+                throw error;
+            }
+            const data = await response.json();
+            const finished = [];
+            data.results.forEach(result => {
+                results[result.idempotency_key] = result;
+                if (FINISHED_STATUSES.includes(result.status)) {
+                    finished.push(result.idempotency_key);
+                }
+                if (result.status === 'invalid' || result.status === 'forbidden') {
+                    console.warn('Server rejected queued questionnaire:', result.error);
+                }
+            });
+            await removeKeys(finished);
+        }
+        return results;
+    }
+
+    // Send every queued questionnaire to the server, a batch at a time.
+    // Returns a map of idempotency_key -> server result for everything sent.
+    // Throws if the network or the server failed (the queue is kept).
+    // Calls are run one after another, so a questionnaire queued while a
+    // sync is running is picked up by the next one.
+    function sync() {
+        const run = lastSync.catch(() => {}).then(sendQueue);
+        lastSync = run;
+        return run;
+    }
+
+    // Forget everything stored on this device (used when logging out, so
+    // the next participant on a shared device can't see or send it)
+    async function clear() {
+        await withStore('readwrite', store => promisify(store.clear()));
+        if (global.caches) {
+            const names = await global.caches.keys();
+            await Promise.all(names.map(name => global.caches.delete(name)));
+        }
+    }
+
+    global.OfflineQueue = { enqueue, getAll, sync, clear };
+})(self);
@@ -0,0 +1,54 @@
+/*
+================================================================================
+SERVICE WORKER
+================================================================================
+Runs in the background of the browser (served at /service-worker.js).
+- Keeps a copy of the CSS/JavaScript, so an open questionnaire keeps
+  working when the connection is flaky. Pages are NOT cached: they show
+  who is logged in, and on a shared device a cached page could make one
+  participant's answers look like another's.
+- Sends queued questionnaires (see offline-queue.js) when the browser
+  gets its connection back, even if the page was closed.
+*/
+
+importScripts('/static/js/offline-queue.js');
+
+// Change the version number whenever the CSS/JavaScript files change
+const CACHE_NAME = 'questionnaire-cache-v2';
+const STATIC_FILES = [
+    '/static/css/style.css',
+    '/static/js/main.js',
+    '/static/js/offline-queue.js'
+];
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(CACHE_NAME).then(cache => cache.addAll(STATIC_FILES)));
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', event => {
+    // Remove caches from older versions of this file
+    event.waitUntil(caches.keys().then(names => Promise.all(
+        names.filter(name => name !== CACHE_NAME).map(name => caches.delete(name))
+    )).then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET' || new URL(request.url).origin !== self.location.origin) {
+        return;
+    }
+
+    // Static files: use the cached copy, fetch it if we don't have one
+    if (request.url.includes('/static/')) {
+        event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+    }
+});
+
+// Background Sync: the page registers 'submit-questionnaires' when it
+// couldn't send; the browser fires this event once it is online again
+self.addEventListener('sync', event => {
+    if (event.tag === 'submit-questionnaires') {
+        event.waitUntil(self.OfflineQueue.sync());
+    }
+});